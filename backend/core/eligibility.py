@@ -0,0 +1,108 @@
+# backend/core/eligibility.py
+import bisect
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+
+from . import utils
+from .models import Loan
+
+# Outcome of one loan application. On rejection final_rate is the requested rate and emi the
+# proposed installment, which is what /check_eligibility reports back.
+Decision = namedtuple('Decision', ['approved', 'final_rate', 'emi', 'tenure', 'message'])
+
+# Repayment-history tiers: a score in (40, 60] pays at least 16%, (60, 85] at least 12%, above 85
+# keeps the requested rate; 40 or less (None) is rejected
+CREDIT_TIER_BOUNDARIES = (40, 60, 85)
+CREDIT_TIER_RATE_FLOORS = (None, Decimal('16.00'), Decimal('12.00'), Decimal('-Infinity'))
+
+TOKEN_SALT = 'core.eligibility'
+TOKEN_MAX_AGE = 60 # Seconds a /check_eligibility result may be reused by /create_loan
+
+# Helper function for EMI calculation (Compound Interest)
+def calculate_emi(loan_amount, annual_interest_rate, tenure_months):
+    if annual_interest_rate == 0 or tenure_months == 0:
+        return Decimal('0.00') # Or handle as error/special case
+
+    # Float64 kernel + memoization live in utils; only the result is a Decimal
+    return utils.calculate_emi(loan_amount, annual_interest_rate, tenure_months)
+
+# Installments of one customer's active loans: approved loans whose end_date is in the future or today.
+# A plain column fetch over loan_active_idx; a customer has few loans, so summing them here is cheaper
+# than a grouped aggregate joined to Customer.
+def active_installments(customer_id, today):
+    return Loan.objects.filter(
+        customer_id=customer_id, loan_approved=True, end_date__gte=today
+    ).values_list('monthly_installment', flat=True)
+
+def evaluate_loan(customer, loan_amount, tenure, interest_rate, today):
+    """
+    Runs the eligibility rules for one application and returns a Decision.
+    Shared by /check_eligibility and /create_loan so both always agree.
+    """
+    proposed_emi = calculate_emi(loan_amount, interest_rate, tenure)
+
+    # 1. Check if current_debt + requested loan_amount > approved_limit
+    # Both fields are already on customer, so this rejection needs no query
+    if (customer.current_debt + loan_amount) > customer.approved_limit:
+        return Decision(False, interest_rate, proposed_emi, tenure,
+                        "Loan rejected: Proposed loan amount plus current debt exceeds approved limit")
+
+    # 2. Check sum of all current EMIs of existing active loans > 50% of monthly salary
+    total_current_emis = sum(active_installments(customer.customer_id, today), Decimal('0.00'))
+    if (total_current_emis + proposed_emi) > (customer.monthly_salary * Decimal('0.5')):
+        return Decision(False, interest_rate, proposed_emi, tenure,
+                        "Loan rejected: Total EMIs (including proposed) exceed 50% of monthly salary")
+
+    # 3. Past loan repayment history (EMIs paid on time rate)
+    final_interest_rate = interest_rate # Start with requested rate
+
+    # Simple "credit score": sum of EMIs paid on time vs. total expected EMIs across all past loans,
+    # kept on the customer by refresh_credit_stats (None when there are no past loans)
+    credit_score_percentage = customer.credit_score_pct
+
+    if credit_score_percentage is not None:
+        # bisect_left puts a score equal to a boundary in the tier below it
+        rate_floor = CREDIT_TIER_RATE_FLOORS[bisect.bisect_left(CREDIT_TIER_BOUNDARIES, credit_score_percentage)]
+        if rate_floor is None: # Poor repayment history
+            return Decision(False, interest_rate, proposed_emi, tenure,
+                            "Loan rejected: Poor past loan repayment history (less than 40% EMIs on time)")
+        final_interest_rate = max(interest_rate, rate_floor)
+    # New customers with no past loans keep the requested rate
+
+    # All checks passed, loan is eligible
+    final_monthly_installment = calculate_emi(loan_amount, final_interest_rate, tenure)
+    return Decision(True, final_interest_rate, final_monthly_installment, tenure, "Loan is eligible for approval")
+
+def _token_payload(customer, loan_amount, tenure, interest_rate):
+    # current_debt is part of the payload, so any loan created in between invalidates the token
+    return [customer.customer_id, str(loan_amount), tenure, str(interest_rate), str(customer.current_debt)]
+
+def issue_token(customer, loan_amount, tenure, interest_rate, decision):
+    """
+    Signs an approved Decision for the exact application it was computed for.
+    /create_loan can redeem it within TOKEN_MAX_AGE seconds instead of re-running evaluate_loan.
+    """
+    return signing.dumps({
+        'application': _token_payload(customer, loan_amount, tenure, interest_rate),
+        'final_rate': str(decision.final_rate),
+        'emi': str(decision.emi),
+    }, key=settings.ELIGIBILITY_TOKEN_KEY, salt=TOKEN_SALT, compress=True)
+
+def redeem_token(token, customer, loan_amount, tenure, interest_rate):
+    """
+    Returns the approved Decision carried by a token from issue_token, or None when the token is
+    missing, tampered with, expired, or was issued for a different application.
+    """
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, key=settings.ELIGIBILITY_TOKEN_KEY, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature: # Also covers SignatureExpired
+        return None
+
+    if data.get('application') != _token_payload(customer, loan_amount, tenure, interest_rate):
+        return None
+    return Decision(True, Decimal(data['final_rate']), Decimal(data['emi']), tenure, "Loan is eligible for approval")
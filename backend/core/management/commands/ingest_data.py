@@ -1,15 +1,95 @@
 # backend/core/management/commands/ingest_data.py
 
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.core.management.color import no_style
+from django.db import connection, transaction
 from core.models import Customer, Loan
+from core.utils import calculate_emi_vec, refresh_credit_stats
+import io
 import os
 from datetime import datetime
 
+def read_spreadsheet(xlsx_path):
+    """
+    Reads an .xlsx input file, preferring an up-to-date .csv copy next to it.
+    Parsing .xlsx through openpyxl is by far the slowest step of ingestion, so the
+    first successful read also writes the .csv copy for subsequent runs.
+    """
+    csv_path = os.path.splitext(xlsx_path)[0] + '.csv'
+    if os.path.exists(csv_path) and (
+        not os.path.exists(xlsx_path) or os.path.getmtime(csv_path) >= os.path.getmtime(xlsx_path)
+    ):
+        return pd.read_csv(csv_path)
+
+    df = pd.read_excel(xlsx_path, engine='openpyxl')
+    try:
+        df.to_csv(csv_path, index=False)
+    except OSError: # Read-only mount; just parse the .xlsx again next time
+        pass
+    return df
+
+def drop_duplicate_ids(df, id_col):
+    """
+    Splits a sheet into (kept, dropped) rows, keeping the first row for each id_col value.
+    One batched upsert can't touch the same row twice (PostgreSQL aborts ON CONFLICT DO UPDATE
+    with "cannot affect row a second time"), so repeated ids are resolved before writing.
+    """
+    duplicated = df[id_col].duplicated(keep='first')
+    return df.loc[~duplicated], df.loc[duplicated]
+
+def reset_pk_sequence(model):
+    """
+    Moves the primary key sequence past the explicit ids inserted from the spreadsheets,
+    so rows created later through the API don't collide with ingested ones.
+    """
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(sql)
+
+def truncate_tables(*models):
+    """
+    Empties the given tables with one TRUNCATE, which costs the same regardless of row count,
+    instead of the per-row cascading deletes issued by QuerySet.delete(). PostgreSQL only.
+    """
+    tables = ', '.join(connection.ops.quote_name(model._meta.db_table) for model in models)
+    with connection.cursor() as cursor:
+        cursor.execute(f'TRUNCATE TABLE {tables} RESTART IDENTITY CASCADE')
+
+def copy_loans(loan_rows):
+    """
+    Streams loan rows into the loan table with PostgreSQL COPY FROM STDIN, which skips the
+    per-statement SQL parsing of multi-row INSERTs. COPY cannot upsert, so this is only used
+    for an initial load into an empty table, and loan_rows must not repeat a loan_id.
+    """
+    loan_rows = loan_rows.assign(loan_approved=False, message=None)
+    for int_col in ('customer_id', 'loan_id', 'tenure', 'emis_paid_on_time'):
+        loan_rows[int_col] = loan_rows[int_col].astype('int64') # e.g. 12.0 would be rejected by COPY
+
+    buffer = io.StringIO()
+    loan_rows.to_csv(buffer, index=False, header=False) # None/NaN become empty fields, i.e. NULL
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(Loan._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(col) for col in loan_rows.columns)
+    sql = f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)'
+    with connection.cursor() as cursor:
+        if hasattr(cursor, 'copy_expert'): # psycopg2
+            cursor.copy_expert(sql, buffer)
+        else: # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
 class Command(BaseCommand):
     help = 'Ingests customer_data.xlsx and loan_data.xlsx into the database.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--truncate', action='store_true',
+            help='Empty the customer and loan tables before ingesting (a single TRUNCATE on PostgreSQL); otherwise rows are upserted by id.'
+        )
+
     def handle(self, *args, **kwargs):
         self.stdout.write(self.style.SUCCESS('Starting data ingestion...'))
 
@@ -23,37 +103,72 @@ class Command(BaseCommand):
         self.stdout.write(f"Customer data path: {CUSTOMER_DATA_PATH}")
         self.stdout.write(f"Loan data path: {LOAN_DATA_PATH}")
 
+        # The two files are independent, so parse them concurrently; the database writes below
+        # stay serial (customers before loans) to respect the foreign key.
+        executor = ThreadPoolExecutor(max_workers=2)
+        customer_future = executor.submit(read_spreadsheet, CUSTOMER_DATA_PATH)
+        loan_future = executor.submit(read_spreadsheet, LOAN_DATA_PATH)
+        executor.shutdown(wait=False) # Both reads keep running; .result() below waits for each
+
 
         # --- Ingest Customer Data ---
         try:
-            customer_df = pd.read_excel(CUSTOMER_DATA_PATH)
+            customer_df = customer_future.result()
             self.stdout.write(self.style.SUCCESS(f"Loaded {len(customer_df)} rows from customer_data.xlsx"))
             # Rename columns to match model fields (case-insensitive and replace spaces)
             customer_df.columns = customer_df.columns.str.lower().str.replace(' ', '_')
 
             with transaction.atomic():
-                # Clear existing customer data if re-running (useful for development)
-                Customer.objects.all().delete()
-                self.stdout.write(self.style.WARNING('Existing customer data cleared.'))
-
-                customers_to_create = []
-                for index, row in customer_df.iterrows():
-                    approved_limit = row.get('approved_limit')
-                    if approved_limit is None: # Calculate if not explicitly present or if it needs to be derived
-                        approved_limit = row['monthly_salary'] * 36
-
-                    customers_to_create.append(
-                        Customer(
-                            customer_id=row['customer_id'],
-                            first_name=row['first_name'],
-                            last_name=row['last_name'],
-                            phone_number=row['phone_number'],
-                            monthly_salary=row['monthly_salary'],
-                            approved_limit=approved_limit,
-                            current_debt=row.get('current_debt', 0)
-                        )
+                # Rows are upserted below, so re-runs don't need to clear existing data first
+                if kwargs['truncate']:
+                    if connection.vendor == 'postgresql':
+                        truncate_tables(Loan, Customer)
+                    else:
+                        Customer.objects.all().delete() # Cascades to loans
+                    self.stdout.write(self.style.WARNING('Existing customer and loan data cleared.'))
+
+                # Vectorized fill-ins instead of per-row fallbacks; itertuples yields plain tuples
+                # rather than a fresh Series per row.
+                customer_df['approved_limit'] = customer_df.get(
+                    'approved_limit', pd.Series(index=customer_df.index, dtype='float64')
+                ).fillna(customer_df['monthly_salary'] * 36)
+                customer_df['current_debt'] = customer_df.get(
+                    'current_debt', pd.Series(0, index=customer_df.index)
+                ).fillna(0)
+
+                # Repeated customer ids: the first row wins, the rest are reported and skipped
+                customer_df, duplicate_customers = drop_duplicate_ids(customer_df, 'customer_id')
+                for customer_id in duplicate_customers['customer_id']:
+                    self.stdout.write(self.style.WARNING(f"Skipping duplicate row for customer {customer_id}: keeping the first one."))
+
+                customer_cols = [
+                    'customer_id', 'first_name', 'last_name', 'age', 'phone_number',
+                    'monthly_salary', 'approved_limit', 'current_debt'
+                ]
+                customers_to_create = [
+                    Customer(
+                        customer_id=customer_id,
+                        first_name=first_name,
+                        last_name=last_name,
+                        age=age,
+                        phone_number=phone_number,
+                        monthly_salary=monthly_salary,
+                        approved_limit=approved_limit,
+                        current_debt=current_debt
                     )
-                Customer.objects.bulk_create(customers_to_create, ignore_conflicts=True)
+                    for (customer_id, first_name, last_name, age, phone_number,
+                         monthly_salary, approved_limit, current_debt)
+                    in customer_df[customer_cols].itertuples(index=False, name=None)
+                ]
+                Customer.objects.bulk_create(
+                    customers_to_create, batch_size=1000,
+                    update_conflicts=True, unique_fields=['customer_id'],
+                    update_fields=[
+                        'first_name', 'last_name', 'age', 'phone_number',
+                        'monthly_salary', 'approved_limit', 'current_debt'
+                    ]
+                )
+                reset_pk_sequence(Customer)
                 self.stdout.write(self.style.SUCCESS(f'Successfully ingested {len(customers_to_create)} customer records.'))
 
         except FileNotFoundError:
@@ -65,49 +180,80 @@ class Command(BaseCommand):
 
         # --- Ingest Loan Data ---
         try:
-            loan_df = pd.read_excel(LOAN_DATA_PATH)
+            loan_df = loan_future.result()
             self.stdout.write(self.style.SUCCESS(f"Loaded {len(loan_df)} rows from loan_data.xlsx"))
             # Rename columns to match model fields
             loan_df.columns = loan_df.columns.str.lower().str.replace(' ', '_')
             loan_df.rename(columns={
                 'monthly_payment': 'monthly_installment', # Rename for consistency with model
             }, inplace=True)
+            # Derive EMIs for rows without a monthly payment in one vectorized pass
+            missing_emi = loan_df['monthly_installment'].isna()
+            if missing_emi.any():
+                loan_df.loc[missing_emi, 'monthly_installment'] = calculate_emi_vec(
+                    loan_df.loc[missing_emi, 'loan_amount'],
+                    loan_df.loc[missing_emi, 'interest_rate'],
+                    loan_df.loc[missing_emi, 'tenure']
+                )
+            # Parse each date column in one pass; unparseable/missing cells become None
+            # (the NaT mask comes from the datetime64 column, not a per-object check on the dates)
+            for date_col in ('date_of_approval', 'end_date'):
+                parsed = pd.to_datetime(loan_df[date_col], errors='coerce')
+                loan_df[date_col] = parsed.dt.date.astype(object).where(parsed.notna(), None)
 
             with transaction.atomic():
-                # Clear existing loan data if re-running
-                Loan.objects.all().delete()
-                self.stdout.write(self.style.WARNING('Existing loan data cleared.'))
-
-                loans_to_create = []
-                for index, row in loan_df.iterrows():
-                    try:
-                        # Ensure customer exists before linking loan
-                        customer = Customer.objects.get(customer_id=row['customer_id'])
-
-                        # Handle date parsing, ensuring None for NaT
-                        date_of_approval = pd.to_datetime(row['date_of_approval']).date() if pd.notna(row['date_of_approval']) else None
-                        end_date = pd.to_datetime(row['end_date']).date() if pd.notna(row['end_date']) else None
-
-                        loans_to_create.append(
-                            Loan(
-                                customer=customer,
-                                loan_id=row['loan_id'],
-                                loan_amount=row['loan_amount'],
-                                tenure=row['tenure'],
-                                interest_rate=row['interest_rate'],
-                                monthly_installment=row['monthly_installment'],
-                                emis_paid_on_time=row['emis_paid_on_time'],
-                                date_of_approval=date_of_approval,
-                                end_date=end_date
-                            )
+                loan_cols = [
+                    'customer_id', 'loan_id', 'loan_amount', 'tenure', 'interest_rate',
+                    'monthly_installment', 'emis_paid_on_time', 'date_of_approval', 'end_date'
+                ]
+
+                # One query for every known customer id instead of a Customer.objects.get per loan row
+                valid_customer_ids = set(Customer.objects.values_list('customer_id', flat=True))
+
+                known_customer = loan_df['customer_id'].isin(valid_customer_ids)
+                for loan_id, customer_id in loan_df.loc[~known_customer, ['loan_id', 'customer_id']].itertuples(index=False, name=None):
+                    self.stdout.write(self.style.WARNING(f"Skipping loan {loan_id}: Customer {customer_id} not found for loan ingestion."))
+
+                loans_to_ingest = loan_df.loc[known_customer, loan_cols]
+
+                # Repeated loan ids: the first row wins, the rest are reported and skipped. Needed by
+                # both write paths, COPY would otherwise hit the primary key mid-stream.
+                loans_to_ingest, duplicate_loans = drop_duplicate_ids(loans_to_ingest, 'loan_id')
+                for loan_id in duplicate_loans['loan_id']:
+                    self.stdout.write(self.style.WARNING(f"Skipping duplicate row for loan {loan_id}: keeping the first one."))
+
+                if connection.vendor == 'postgresql' and not Loan.objects.exists():
+                    # Initial load into an empty table: nothing to upsert, so stream rows with COPY
+                    copy_loans(loans_to_ingest)
+                else:
+                    loans_to_create = [
+                        Loan(
+                            customer_id=customer_id, # Raw FK value, no Customer instance needed
+                            loan_id=loan_id,
+                            loan_amount=loan_amount,
+                            tenure=tenure,
+                            interest_rate=interest_rate,
+                            monthly_installment=monthly_installment,
+                            emis_paid_on_time=emis_paid_on_time,
+                            date_of_approval=date_of_approval,
+                            end_date=end_date
                         )
-                    except Customer.DoesNotExist:
-                        self.stdout.write(self.style.WARNING(f"Skipping loan {row['loan_id']}: Customer {row['customer_id']} not found for loan ingestion."))
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"Error processing loan {row['loan_id']}: {e}"))
+                        for (customer_id, loan_id, loan_amount, tenure, interest_rate, monthly_installment,
+                             emis_paid_on_time, date_of_approval, end_date)
+                        in loans_to_ingest.itertuples(index=False, name=None)
+                    ]
 
-                Loan.objects.bulk_create(loans_to_create, ignore_conflicts=True)
-                self.stdout.write(self.style.SUCCESS(f'Successfully ingested {len(loans_to_create)} loan records.'))
+                    Loan.objects.bulk_create(
+                        loans_to_create, batch_size=500,
+                        update_conflicts=True, unique_fields=['loan_id'],
+                        update_fields=[
+                            'customer', 'loan_amount', 'tenure', 'interest_rate', 'monthly_installment',
+                            'emis_paid_on_time', 'date_of_approval', 'end_date'
+                        ]
+                    )
+                reset_pk_sequence(Loan)
+                refresh_credit_stats() # Bulk loads don't fire the Loan signals
+                self.stdout.write(self.style.SUCCESS(f'Successfully ingested {len(loans_to_ingest)} loan records.'))
 
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f"Error: loan_data.xlsx not found at {LOAN_DATA_PATH}"))
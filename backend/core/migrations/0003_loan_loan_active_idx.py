@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-15 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_customer_age_customer_user_loan_loan_approved_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'loan_approved', 'end_date'], include=('monthly_installment', 'tenure', 'emis_paid_on_time'), name='loan_active_idx'),
+        ),
+    ]
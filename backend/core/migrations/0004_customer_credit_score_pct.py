@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-15 08:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Greatest
+
+
+def backfill_credit_score_pct(apps, schema_editor):
+    # Same computation as core.utils.refresh_credit_stats, against the historical models
+    Customer = apps.get_model('core', 'Customer')
+    Loan = apps.get_model('core', 'Loan')
+
+    customer_loans = Loan.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+    total_on_time = customer_loans.annotate(n=Sum('emis_paid_on_time')).values('n')
+    total_tenure = customer_loans.annotate(n=Sum('tenure')).values('n')
+
+    Customer.objects.update(
+        credit_score_pct=Cast(Subquery(total_on_time), models.FloatField())
+        * 100 / Greatest(Subquery(total_tenure), 1),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_loan_loan_active_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='credit_score_pct',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=7, null=True),
+        ),
+        migrations.RunPython(backfill_credit_score_pct, migrations.RunPython.noop),
+    ]
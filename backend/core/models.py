@@ -15,6 +15,10 @@ class Customer(models.Model):
     current_debt = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     # Link to Django's User model for authentication. Null=True, Blank=True for initial data ingestion.
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
+    # EMIs paid on time as a percentage of total tenure across all loans, read by core.eligibility;
+    # null for customers without loans; kept current by core.signals. Four decimal places keep the
+    # tier comparisons exact.
+    credit_score_pct = models.DecimalField(max_digits=7, decimal_places=4, null=True, blank=True)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.customer_id})"
@@ -39,6 +43,17 @@ class Loan(models.Model):
     loan_approved = models.BooleanField(default=False)
     message = models.CharField(max_length=255, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Covers the "active loans" filter (approved, end_date >= today) in the eligibility query; the
+            # included columns also serve the per-customer credit_score_pct refresh as an index-only scan
+            models.Index(
+                fields=['customer', 'loan_approved', 'end_date'],
+                name='loan_active_idx',
+                include=['monthly_installment', 'tenure', 'emis_paid_on_time'],
+            ),
+        ]
+
     def __str__(self):
         return f"Loan {self.loan_id} for Customer {self.customer.customer_id}"
 
@@ -0,0 +1,13 @@
+# backend/core/parsers.py
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+class ORJSONParser(JSONParser):
+    # Same media type and error reporting as DRF's JSONParser, decoding with orjson
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
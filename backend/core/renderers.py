@@ -0,0 +1,41 @@
+# backend/core/renderers.py
+import datetime
+import decimal
+
+import orjson
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import JSONRenderer
+
+def _default(obj):
+    # Types orjson does not serialize natively, handled the way DRF's JSONEncoder does
+    if isinstance(obj, decimal.Decimal):
+        return float(obj) # The views put raw Decimals (EMIs, limits, rates) in their responses
+    if isinstance(obj, Promise):
+        return force_str(obj) # Lazily translated error messages
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist() # numpy arrays and scalars
+    if hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    DRF's JSONRenderer with the encoding done by orjson.
+    Output is compact UTF-8 as with DRF's defaults, and UTC datetimes end in "Z" as DRF renders them.
+    Differences: a requested indent gives orjson's 2-space indent, and NaN/Infinity floats render as
+    null where DRF raises.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=option)
@@ -1,7 +1,12 @@
 # backend/core/serializers.py
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional
+
 from rest_framework import serializers
 from .models import Customer, Loan
 from django.contrib.auth.models import User
+from django.db import transaction
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -49,6 +54,7 @@ class RegisterCustomerSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['customer_id', 'approved_limit', 'current_debt'] # Auto-generated/calculated
 
+    @transaction.atomic # User + Customer INSERTs share one commit, and no orphan User is left if the second fails
     def create(self, validated_data):
         # Create Django User linked to the customer
         user = User.objects.create_user(
@@ -70,6 +76,44 @@ class LoanApplicationSerializer(serializers.Serializer):
     loan_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     tenure = serializers.IntegerField()
     interest_rate = serializers.DecimalField(max_digits=5, decimal_places=2)
+    eligibility_token = serializers.CharField(required=False) # Optional, from a prior /check_eligibility response
+
+@dataclass(frozen=True)
+class LoanApplication:
+    # Validated /check_eligibility and /create_loan request body
+    customer_id: int
+    loan_amount: Decimal
+    tenure: int
+    interest_rate: Decimal
+    eligibility_token: Optional[str] = None
+
+# LoanApplicationSerializer's fields, built once; their run_validation() is stateless
+_LOAN_APPLICATION_FIELDS = LoanApplicationSerializer().fields
+
+def parse_loan_application(data):
+    """
+    Validates a loan application body and returns (LoanApplication, None) or (None, errors).
+    A well-formed JSON body is validated field by field with the prebuilt serializer fields above
+    (run_validation, so blank/null checks and validators apply as in the serializer), skipping the
+    per-request serializer construction; anything else goes through LoanApplicationSerializer
+    itself, so invalid input gets the usual DRF error format.
+    """
+    if type(data) is dict: # Parsed JSON; form data (QueryDict) takes the full serializer path
+        try:
+            values = {
+                name: field.run_validation(data[name])
+                for name, field in _LOAN_APPLICATION_FIELDS.items()
+                if name in data or field.required
+            }
+        except (KeyError, serializers.ValidationError):
+            pass
+        else:
+            return LoanApplication(**values), None
+
+    serializer = LoanApplicationSerializer(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return LoanApplication(**serializer.validated_data), None
 
 class CustomerLoansListSerializer(serializers.ModelSerializer):
     # This serializer is for the /view-loans/<customer_id> endpoint
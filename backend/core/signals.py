@@ -0,0 +1,13 @@
+# backend/core/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Loan
+from .utils import refresh_credit_stats
+
+@receiver(post_save, sender=Loan)
+@receiver(post_delete, sender=Loan)
+def refresh_customer_credit_stats(sender, instance, **kwargs):
+    # Keep the customer's denormalized credit_score_pct in step with their loans.
+    # Bulk writes (bulk_create, COPY, QuerySet.update) bypass signals and must call refresh_credit_stats themselves.
+    refresh_credit_stats([instance.customer_id])
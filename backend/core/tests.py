@@ -1,3 +1,507 @@
-from django.test import TestCase
+# backend/core/tests.py
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+import os
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import eligibility
+from .management.commands.ingest_data import copy_loans
+from .models import Customer, Loan
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .serializers import LoanApplicationSerializer, parse_loan_application
+from .utils import calculate_emi, calculate_emi_vec, refresh_credit_stats
+
+
+class CalculateEmiTests(SimpleTestCase):
+    # (loan_amount, annual_interest_rate, tenure_months) -> EMI from the original Decimal formula
+    CASES = [
+        ((100000, Decimal('10.5'), 12), Decimal('8814.86')),
+        ((250000, Decimal('8'), 240), Decimal('2091.10')),
+        ((5000, Decimal('0.01'), 6), Decimal('833.36')),
+        ((1000, Decimal('0'), 6), Decimal('166.67')),
+        # (1 + r)^n is beyond float64 range here; the EMI tends to P * r
+        ((100000, Decimal('10'), 90000), Decimal('833.33')),
+    ]
+
+    def test_vectorized_matches_decimal_formula(self):
+        amounts, rates, tenures = zip(*(args for args, _ in self.CASES))
+
+        emis = calculate_emi_vec(amounts, rates, tenures)
+
+        self.assertEqual([Decimal(str(emi)) for emi in emis], [emi for _, emi in self.CASES])
+
+    def test_scalar_matches_decimal_formula(self):
+        for args, emi in self.CASES:
+            with self.subTest(args=args):
+                self.assertEqual(calculate_emi(*args), emi)
+
+
+class IngestDataTests(TestCase):
+    CUSTOMER_COLUMNS = [
+        'Customer ID', 'First Name', 'Last Name', 'Age', 'Phone Number', 'Monthly Salary', 'Approved Limit'
+    ]
+    LOAN_COLUMNS = [
+        'Customer ID', 'Loan ID', 'Loan Amount', 'Tenure', 'Interest Rate', 'Monthly payment',
+        'EMIs paid on Time', 'Date of Approval', 'End Date'
+    ]
+
+    def ingest(self, customers, loans):
+        sheets = {
+            'customer_data.xlsx': (customers, self.CUSTOMER_COLUMNS),
+            'loan_data.xlsx': (loans, self.LOAN_COLUMNS),
+        }
+
+        def read_spreadsheet(xlsx_path):
+            rows, columns = sheets[os.path.basename(xlsx_path)]
+            return pd.DataFrame(rows, columns=columns)
+
+        out = StringIO()
+        with mock.patch('core.management.commands.ingest_data.read_spreadsheet', side_effect=read_spreadsheet):
+            call_command('ingest_data', stdout=out)
+        output = out.getvalue()
+        self.assertNotIn('Error', output)
+        return output
+
+    def test_ingests_rows_and_skips_duplicates_and_unknown_customers(self):
+        output = self.ingest(
+            customers=[
+                (1, 'Asha', 'Rao', 30, '9000000001', 50000, 1800000),
+                (2, 'Ravi', 'Iyer', 41, '9000000002', 80000, None),
+                (1, 'Asha', 'Duplicate', 30, '9000000003', 1, 1),
+            ],
+            loans=[
+                (1, 10, 100000, 12, 10.5, 8814.86, 12, '2020-01-15', '2021-01-15'),
+                (2, 11, 250000, 240, 8, None, 3, '2022-05-01', '2042-05-01'),
+                (1, 10, 1, 1, 1, 1, 1, '2020-01-15', '2020-02-15'),
+                (99, 12, 5000, 6, 5, 850, 0, '2023-01-01', '2023-07-01'),
+            ],
+        )
+
+        self.assertIn('Skipping duplicate row for customer 1: keeping the first one.', output)
+        self.assertIn('Skipping duplicate row for loan 10: keeping the first one.', output)
+        self.assertIn('Skipping loan 12: Customer 99 not found', output)
+        self.assertIn('Successfully ingested 2 customer records.', output)
+        self.assertIn('Successfully ingested 2 loan records.', output)
+
+        self.assertEqual(Customer.objects.get(pk=1).last_name, 'Rao')
+        self.assertEqual(Customer.objects.get(pk=2).approved_limit, Decimal('2880000')) # monthly_salary * 36
+        self.assertEqual(Loan.objects.get(pk=10).monthly_installment, Decimal('8814.86'))
+        self.assertEqual(Loan.objects.get(pk=11).monthly_installment, Decimal('2091.10')) # Derived EMI
+        self.assertEqual(Loan.objects.count(), 2)
+        # bulk_create skips the Loan signals; the command refreshes every customer afterwards
+        self.assertEqual(Customer.objects.get(pk=1).credit_score_pct, Decimal('100.0000'))
+        self.assertEqual(Customer.objects.get(pk=2).credit_score_pct, Decimal('1.2500'))
+
+    def test_reingest_updates_existing_rows(self):
+        loan = (1, 10, 100000, 12, 10.5, 8814.86, 6, '2020-01-15', '2021-01-15')
+        self.ingest(customers=[(1, 'Asha', 'Rao', 30, '9000000001', 50000, 1800000)], loans=[loan])
+
+        self.ingest(
+            customers=[(1, 'Asha', 'Rao', 31, '9000000001', 60000, 2160000)],
+            loans=[loan[:6] + (12,) + loan[7:]],
+        )
+
+        customer = Customer.objects.get(pk=1)
+        self.assertEqual((customer.age, customer.monthly_salary), (31, Decimal('60000')))
+        self.assertEqual(Loan.objects.get(pk=10).emis_paid_on_time, 12)
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_new_rows_are_numbered_after_ingested_ids(self):
+        self.ingest(
+            customers=[(500, 'Asha', 'Rao', 30, '9000000001', 50000, 1800000)],
+            loans=[(500, 700, 100000, 12, 10.5, 8814.86, 12, '2020-01-15', '2021-01-15')],
+        )
+
+        customer = Customer.objects.create(
+            first_name='New', last_name='Customer', age=25, phone_number='9000000009',
+            monthly_salary=40000, approved_limit=1440000
+        )
+        loan = Loan.objects.create(
+            customer=customer, loan_amount=1000, tenure=6, interest_rate=5, monthly_installment=169
+        )
+
+        self.assertGreater(customer.pk, 500)
+        self.assertGreater(loan.pk, 700)
+
+
+
+class RefreshCreditStatsTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name='Asha', last_name='Rao', age=30, phone_number='9000000001',
+            monthly_salary=50000, approved_limit=1800000
+        )
+
+    def add_loan(self, tenure, emis_paid_on_time):
+        return Loan.objects.create(
+            customer=self.customer, loan_amount=1000, tenure=tenure, interest_rate=10,
+            monthly_installment=100, emis_paid_on_time=emis_paid_on_time
+        )
+
+    def credit_score_pct(self):
+        return Customer.objects.values_list('credit_score_pct', flat=True).get(pk=self.customer.pk)
+
+    def test_null_without_loans(self):
+        refresh_credit_stats()
+
+        self.assertIsNone(self.credit_score_pct())
+
+    def test_on_time_share_of_total_tenure_across_loans(self):
+        self.add_loan(tenure=12, emis_paid_on_time=12)
+        self.add_loan(tenure=24, emis_paid_on_time=10)
+
+        self.assertEqual(self.credit_score_pct(), Decimal('61.1111')) # 22 / 36, refreshed by post_save
+
+    def test_refreshed_when_a_loan_is_deleted(self):
+        self.add_loan(tenure=12, emis_paid_on_time=12)
+        self.add_loan(tenure=24, emis_paid_on_time=10).delete()
+
+        self.assertEqual(self.credit_score_pct(), Decimal('100.0000'))
+
+    def test_refreshes_only_the_given_customers(self):
+        self.add_loan(tenure=12, emis_paid_on_time=6)
+        Customer.objects.update(credit_score_pct=None)
+
+        refresh_credit_stats([self.customer.pk + 1])
+        self.assertIsNone(self.credit_score_pct())
+
+        refresh_credit_stats([self.customer.pk])
+        self.assertEqual(self.credit_score_pct(), Decimal('50.0000'))
+
+class CopyLoansTests(SimpleTestCase):
+    LOAN_ROWS = pd.DataFrame(
+        [
+            (1.0, 10.0, 100000.0, 12.0, 10.5, 8814.86, 12.0, date(2020, 1, 15), date(2021, 1, 15)),
+            (2.0, 11.0, 5000.0, 6.0, 5.0, 850.0, 0.0, None, None),
+        ],
+        columns=[
+            'customer_id', 'loan_id', 'loan_amount', 'tenure', 'interest_rate',
+            'monthly_installment', 'emis_paid_on_time', 'date_of_approval', 'end_date'
+        ],
+    )
+    SQL = (
+        'COPY "core_loan" ("customer_id", "loan_id", "loan_amount", "tenure", "interest_rate", '
+        '"monthly_installment", "emis_paid_on_time", "date_of_approval", "end_date", "loan_approved", "message") '
+        'FROM STDIN WITH (FORMAT csv)'
+    )
+    CSV = (
+        '1,10,100000.0,12,10.5,8814.86,12,2020-01-15,2021-01-15,False,\n'
+        '2,11,5000.0,6,5.0,850.0,0,,,False,\n'
+    )
+
+    def copy_with(self, cursor):
+        connection = mock.Mock()
+        connection.ops.quote_name = lambda name: f'"{name}"'
+        connection.cursor.return_value.__enter__ = mock.Mock(return_value=cursor)
+        connection.cursor.return_value.__exit__ = mock.Mock(return_value=False)
+        with mock.patch('core.management.commands.ingest_data.connection', connection):
+            copy_loans(self.LOAN_ROWS)
+
+    def test_psycopg2_copy_expert(self):
+        class Cursor:
+            def copy_expert(self, sql, file):
+                self.copied = (sql, file.read())
+
+        cursor = Cursor()
+        self.copy_with(cursor)
+
+        self.assertEqual(cursor.copied, (self.SQL, self.CSV))
+
+    def test_psycopg3_copy(self):
+        class Cursor:
+            copied = None
+
+            @contextmanager
+            def copy(self, sql):
+                written = []
+                yield mock.Mock(write=written.append)
+                self.copied = (sql, ''.join(written))
+
+        cursor = Cursor()
+        self.copy_with(cursor)
+
+        self.assertEqual(cursor.copied, (self.SQL, self.CSV))
+
+
+class LoanApiTestCase(APITestCase):
+    # Shared fixtures: customers with a chosen repayment history and a JWT carrying their customer_id claim
+
+    def make_customer(self, phone_number, credit_score_pct=None, **fields):
+        customer = Customer.objects.create(
+            first_name='Test', last_name=phone_number, age=30, phone_number=phone_number,
+            monthly_salary=fields.pop('monthly_salary', Decimal('100000.00')),
+            approved_limit=fields.pop('approved_limit', Decimal('1000000.00')),
+            user=User.objects.create_user(username=phone_number, password='secret'),
+            **fields
+        )
+        if credit_score_pct is not None:
+            # A closed, unapproved past loan over 100 months: EMIs paid on time == the score in percent.
+            # The post_save signal refreshes credit_score_pct from it.
+            Loan.objects.create(
+                customer=customer, loan_amount=Decimal('10000.00'), tenure=100, interest_rate=Decimal('10.00'),
+                monthly_installment=Decimal('100.00'), emis_paid_on_time=credit_score_pct,
+            )
+        return customer
+
+    def authenticate(self, customer):
+        refresh = RefreshToken.for_user(customer.user)
+        refresh['customer_id'] = customer.customer_id
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def application(self, customer, loan_amount='100000.00', **extra):
+        return {'customer_id': customer.customer_id, 'loan_amount': loan_amount,
+                'interest_rate': '10.00', 'tenure': 12, **extra}
+
+
+class CheckEligibilityTests(LoanApiTestCase):
+
+    def test_credit_tier_boundaries(self):
+        # A score equal to a boundary falls in the tier below it
+        cases = [
+            (40, False, Decimal('10.00')), (41, True, Decimal('16.00')),
+            (60, True, Decimal('16.00')), (61, True, Decimal('12.00')),
+            (85, True, Decimal('12.00')), (86, True, Decimal('10.00')),
+        ]
+        for score, approved, rate in cases:
+            with self.subTest(score=score):
+                customer = self.make_customer(f'90000000{score}', credit_score_pct=score)
+                self.authenticate(customer)
+
+                response = self.client.post('/check_eligibility', self.application(customer), format='json')
+
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data['loan_approved'], approved)
+                self.assertEqual(response.data['interest_rate'], rate)
+                self.assertEqual('eligibility_token' in response.data, approved)
+
+    def test_new_customer_keeps_requested_rate(self):
+        customer = self.make_customer('9000000001')
+        self.authenticate(customer)
+
+        response = self.client.post('/check_eligibility', self.application(customer), format='json')
+
+        self.assertTrue(response.data['loan_approved'])
+        self.assertEqual(response.data['interest_rate'], Decimal('10.00'))
+        self.assertEqual(response.data['monthly_installment'], eligibility.calculate_emi(
+            Decimal('100000.00'), Decimal('10.00'), 12))
+
+    def test_rejects_other_customers(self):
+        customer = self.make_customer('9000000001')
+        self.authenticate(self.make_customer('9000000002'))
+
+        response = self.client.post('/check_eligibility', self.application(customer), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class EligibilityTokenTests(LoanApiTestCase):
+    # /create_loan may reuse a /check_eligibility decision only for the exact application it was issued for;
+    # any other token falls back to evaluate_loan, which rejects every application below
+
+    def check(self, customer, **application):
+        self.authenticate(customer)
+        response = self.client.post('/check_eligibility', self.application(customer, **application), format='json')
+        self.assertTrue(response.data['loan_approved'])
+        return response.data['eligibility_token']
+
+    def create(self, customer, token, **application):
+        self.authenticate(customer)
+        return self.client.post(
+            '/create_loan', self.application(customer, eligibility_token=token, **application), format='json'
+        )
+
+    def assertRejected(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['loan_approved'])
+        self.assertIsNone(response.data['loan_id'])
+
+    def test_token_for_same_application_is_redeemed(self):
+        customer = self.make_customer('9000000001', credit_score_pct=70)
+        token = self.check(customer)
+
+        response = self.create(customer, token)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        loan = Loan.objects.get(pk=response.data['loan_id'])
+        self.assertEqual(loan.interest_rate, Decimal('12.00'))
+        customer.refresh_from_db()
+        self.assertEqual(customer.current_debt, Decimal('100000.00'))
+
+    def test_token_for_different_amount_is_ignored(self):
+        customer = self.make_customer('9000000001', credit_score_pct=90)
+        token = self.check(customer)
+
+        self.assertRejected(self.create(customer, token, loan_amount='2000000.00')) # Over the approved limit
+
+    def test_token_for_different_customer_is_ignored(self):
+        token = self.check(self.make_customer('9000000001', credit_score_pct=90))
+        other = self.make_customer('9000000002', credit_score_pct=10)
+
+        self.assertRejected(self.create(other, token))
+
+    def test_token_is_ignored_after_current_debt_changes(self):
+        customer = self.make_customer('9000000001', credit_score_pct=90, monthly_salary=Decimal('200000.00'))
+        token = self.check(customer, loan_amount='600000.00')
+        Customer.objects.filter(pk=customer.pk).update(current_debt=Decimal('500000.00'))
+
+        self.assertRejected(self.create(customer, token, loan_amount='600000.00'))
+
+    def test_token_signed_with_secret_key_is_ignored(self):
+        customer = self.make_customer('9000000001', credit_score_pct=10)
+        forged = signing.dumps({
+            'application': [customer.customer_id, '100000.00', 12, '10.00', '0.00'],
+            'final_rate': '10.00', 'emi': '1.00',
+        }, salt=eligibility.TOKEN_SALT, compress=True)
+
+        self.assertRejected(self.create(customer, forged))
+
+    def test_expired_token_is_ignored(self):
+        customer = self.make_customer('9000000001', credit_score_pct=90)
+        token = self.check(customer)
+        Customer.objects.filter(pk=customer.pk).update(approved_limit=Decimal('50000.00'))
+
+        with mock.patch.object(eligibility, 'TOKEN_MAX_AGE', -1):
+            self.assertRejected(self.create(customer, token))
+
+
+class ViewCustomerLoansTests(LoanApiTestCase):
+
+    def add_loan(self, customer, approved=True, tenure=12, emis_paid_on_time=0, date_of_approval=None):
+        return Loan.objects.create(
+            customer=customer, loan_amount=Decimal('1000.00'), tenure=tenure, interest_rate=Decimal('10.00'),
+            monthly_installment=Decimal('87.92'), emis_paid_on_time=emis_paid_on_time, loan_approved=approved,
+            date_of_approval=date_of_approval, end_date=date.today() + timedelta(days=30 * tenure),
+        )
+
+    def test_lists_only_approved_loans_with_repayments_left(self):
+        customer = self.make_customer('9000000001')
+        older = self.add_loan(customer, emis_paid_on_time=3, date_of_approval=date(2024, 1, 1))
+        newer = self.add_loan(customer, date_of_approval=date(2024, 6, 1))
+        self.add_loan(customer, emis_paid_on_time=12) # Fully repaid
+        self.add_loan(customer, approved=False) # Never approved
+        self.add_loan(self.make_customer('9000000002')) # Someone else's
+        self.authenticate(customer)
+
+        response = self.client.get(f'/view-loans/{customer.customer_id}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([loan['loan_id'] for loan in response.data], [newer.loan_id, older.loan_id])
+        self.assertEqual([loan['repayments_left'] for loan in response.data], [12, 9])
+
+    def test_rejects_other_customers(self):
+        customer = self.make_customer('9000000001')
+        self.authenticate(self.make_customer('9000000002'))
+
+        response = self.client.get(f'/view-loans/{customer.customer_id}')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ParseLoanApplicationTests(SimpleTestCase):
+    # The plain-dict fast path must accept and reject exactly what LoanApplicationSerializer does
+
+    def assertMatchesSerializer(self, data):
+        application, errors = parse_loan_application(data)
+        serializer = LoanApplicationSerializer(data=data)
+
+        if serializer.is_valid():
+            self.assertIsNone(errors)
+            self.assertEqual(vars(application), {'eligibility_token': None, **serializer.validated_data})
+        else:
+            self.assertIsNone(application)
+            self.assertEqual(errors, serializer.errors)
+        return application, errors
+
+    def test_parses_json_body(self):
+        application, errors = self.assertMatchesSerializer(
+            {'customer_id': 1, 'loan_amount': '1000.5', 'tenure': '12', 'interest_rate': 9.5,
+             'eligibility_token': ' abc '}
+        )
+
+        self.assertIsNone(errors)
+        self.assertEqual(application.loan_amount, Decimal('1000.50'))
+        self.assertEqual(application.tenure, 12)
+        self.assertEqual(application.interest_rate, Decimal('9.50'))
+        self.assertEqual(application.eligibility_token, 'abc')
+
+    def test_reports_field_errors(self):
+        application, errors = self.assertMatchesSerializer(
+            {'customer_id': 1, 'loan_amount': 'abc', 'interest_rate': '1', 'eligibility_token': ''}
+        )
+
+        self.assertIsNone(application)
+        self.assertEqual(set(errors), {'loan_amount', 'tenure', 'eligibility_token'})
+
+    def test_runs_field_validators(self):
+        valid = {'customer_id': 1, 'loan_amount': '1000', 'tenure': 12, 'interest_rate': '9.5'}
+        cases = [
+            {'eligibility_token': 'a\x00b'}, # Null characters are rejected by the CharField
+            {'eligibility_token': None},
+            {'loan_amount': '123456789.00'}, # More digits than max_digits
+            {'tenure': True},
+            {'customer_id': None},
+        ]
+        for extra in cases:
+            with self.subTest(extra=extra):
+                application, errors = self.assertMatchesSerializer({**valid, **extra})
+
+                self.assertIsNone(application)
+                self.assertEqual(set(errors), set(extra))
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    # Must produce the same bytes as DRF's JSONRenderer with its default settings
+
+    def test_matches_drf_json_renderer(self):
+        cases = [
+            {'emi': Decimal('8814.86'), 'limit': Decimal('1800000.00'), 'rate': Decimal('12')},
+            {'at': datetime(2024, 1, 15, 9, 30, tzinfo=timezone.utc)},
+            {'at': datetime(2024, 1, 15, 9, 30, 15, 250000, tzinfo=timezone(timedelta(hours=5, minutes=30)))},
+            {'on': date(2024, 1, 15)},
+            {'message': gettext_lazy('This field is required.')},
+            {'took': timedelta(minutes=1, seconds=30)},
+            {'raw': b'abc'},
+            {1: 'non-string key', 'name': 'Ravi \u20b9'},
+            [{'loan_id': 1, 'loan_approved': True, 'message': None}],
+        ]
+        for data in cases:
+            with self.subTest(data=data):
+                self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_none_renders_empty_body(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+
+class ORJSONParserTests(LoanApiTestCase):
+
+    def test_parses_json_body(self):
+        data = ORJSONParser().parse(BytesIO(b'{"loan_amount": 1000.5, "tenure": 12, "token": "\\u20b9"}'))
+
+        self.assertEqual(data, {'loan_amount': 1000.5, 'tenure': 12, 'token': '\u20b9'})
+
+    def test_malformed_body_is_a_parse_error(self):
+        with self.assertRaisesMessage(ParseError, 'JSON parse error'):
+            ORJSONParser().parse(BytesIO(b'{bad'))
+
+        customer = self.make_customer('9000000001')
+        self.authenticate(customer)
+        response = self.client.post('/check_eligibility', '{bad', content_type='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.json()['detail'].startswith('JSON parse error'))
@@ -1,5 +1,6 @@
 # backend/core/urls.py
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     RegisterView, LoginView, CheckEligibilityView, CreateLoanView,
     ViewLoanDetailsView, ViewCustomerLoansView
@@ -8,6 +9,7 @@ from .views import (
 urlpatterns = [
     path('register', RegisterView.as_view(), name='register'),
     path('login', LoginView.as_view(), name='login'),
+    path('token/refresh', TokenRefreshView.as_view(), name='token_refresh'),
     path('check_eligibility', CheckEligibilityView.as_view(), name='check_eligibility'),
     path('create_loan', CreateLoanView.as_view(), name='create_loan'),
     path('view-loan/<int:loan_id>', ViewLoanDetailsView.as_view(), name='view_loan_details'),
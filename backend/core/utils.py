@@ -1,9 +1,26 @@
 # backend/core/utils.py
 
+import functools
 import math
 from datetime import date, timedelta
 from decimal import Decimal
 
+import numpy as np
+from django.db.models import FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Greatest
+
+def _emi_f64(principal, annual_interest_rate, tenure_months):
+    # Float64 EMI kernel shared by calculate_emi
+    if annual_interest_rate == 0:
+        return principal / tenure_months
+
+    # Convert annual interest rate to monthly decimal rate
+    monthly_interest_rate = annual_interest_rate / 1200.0
+    # (1 + r)^n as exp(n * log1p(r)): two libm calls, and log1p keeps precision for small r
+    growth = math.exp(tenure_months * math.log1p(monthly_interest_rate))
+    return principal * monthly_interest_rate * growth / (growth - 1.0)
+
+@functools.lru_cache(maxsize=1024) # Same (amount, rate, tenure) is priced twice per application
 def calculate_emi(loan_amount, annual_interest_rate, tenure_months):
     """
     Calculates EMI using the compound interest formula.
@@ -12,24 +29,36 @@ def calculate_emi(loan_amount, annual_interest_rate, tenure_months):
     P = Principal Loan Amount
     R = Monthly Interest Rate (annual_interest_rate / 12 / 100)
     N = Number of Monthly Installments (tenure_months)
+    The maths runs in float64; only the result is converted back to Decimal.
     """
-    if annual_interest_rate == 0:
-        return loan_amount / tenure_months
+    loan_amount = float(loan_amount)
+    try:
+        emi = _emi_f64(loan_amount, float(annual_interest_rate), float(tenure_months))
+    except ZeroDivisionError: # Handle case where denominator becomes zero (e.g. a vanishingly small rate)
+        emi = loan_amount / tenure_months
+    except OverflowError: # (1 + r)^n beyond float64 range, i.e. huge tenures: the EMI tends to P * r
+        emi = loan_amount * float(annual_interest_rate) / 1200.0
 
-    # Convert annual interest rate to monthly decimal rate
-    monthly_interest_rate = (annual_interest_rate / 100) / 12
+    return Decimal(emi).quantize(Decimal('0.01')) # Round to 2 decimal places
 
-    # Calculate EMI
-    # Use Decimal for financial calculations to avoid floating point inaccuracies
-    try:
-        emi = (
-            loan_amount * monthly_interest_rate * (1 + monthly_interest_rate)**tenure_months
-        ) / ((1 + monthly_interest_rate)**tenure_months - 1)
-    except ZeroDivisionError: # Handle case where denominator becomes zero (e.g. 0% interest for 1 month)
-        return loan_amount / tenure_months
+def calculate_emi_vec(loan_amounts, annual_interest_rates, tenures_months):
+    """
+    Vectorized calculate_emi for bulk paths (e.g. data ingestion).
+    Evaluates the same formula on float64 arrays in one pass and returns EMIs rounded
+    to 2 decimal places; convert to Decimal only when handing values to the ORM.
+    """
+    principal = np.asarray(loan_amounts, dtype='float64')
+    annual = np.asarray(annual_interest_rates, dtype='float64')
+    tenure = np.asarray(tenures_months, dtype='float64')
 
+    monthly_rate = annual / 1200.0
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'): # Resolved by the where() calls below
+        growth = np.exp(tenure * np.log1p(monthly_rate)) # Same form as _emi_f64
+        emi = np.where(annual == 0, principal / tenure, principal * monthly_rate * growth / (growth - 1))
+    # (1 + r)^n overflows float64 for tenures of tens of thousands of months; the EMI then tends to P * r
+    emi = np.where(np.isinf(growth), principal * monthly_rate, emi)
 
-    return Decimal(emi).quantize(Decimal('0.01')) # Round to 2 decimal places
+    return np.round(emi, 2)
 
 def check_credit_eligibility(customer, loan_amount, annual_interest_rate, tenure):
     """
@@ -111,4 +140,24 @@ def check_credit_eligibility(customer, loan_amount, annual_interest_rate, tenure
         return False, None, None, None, "Loan not approved: Total debt including new loan exceeds approved limit."
 
 
-    return True, final_interest_rate, monthly_installment, tenure, "Loan approved."
\ No newline at end of file
+    return True, final_interest_rate, monthly_installment, tenure, "Loan approved."
+
+def refresh_credit_stats(customer_ids=None):
+    """
+    Recomputes the denormalized Customer.credit_score_pct column in a single UPDATE, for the
+    given customers or for all of them when customer_ids is None.
+    credit_score_pct is EMIs paid on time over total tenure, as a percentage; null without loans.
+    """
+    from core.models import Customer, Loan # Import here to avoid circular dependency
+
+    customer_loans = Loan.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+    total_on_time = customer_loans.annotate(n=Sum('emis_paid_on_time')).values('n')
+    total_tenure = customer_loans.annotate(n=Sum('tenure')).values('n')
+
+    customers = Customer.objects.all() if customer_ids is None else Customer.objects.filter(pk__in=customer_ids)
+    customers.update(
+        # Float division, rounded to the column's 4 places on save; a zero tenure sum counts as 1,
+        # as the eligibility rules always did
+        credit_score_pct=Cast(Subquery(total_on_time), FloatField())
+        * 100 / Greatest(Subquery(total_tenure), 1),
+    )
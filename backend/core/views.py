@@ -2,41 +2,20 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
-from django.db.models import Sum, F
+from django.db import transaction
+from django.db.models import F
 from datetime import date, timedelta
-from decimal import Decimal
-import math
 
+from . import eligibility
 from .models import Customer, Loan
 from .serializers import (
-    RegisterCustomerSerializer, LoanApplicationSerializer,
-    LoanDetailSerializer, CustomerLoansListSerializer
+    RegisterCustomerSerializer, LoanDetailSerializer, CustomerLoansListSerializer,
+    parse_loan_application
 )
 
-# Helper function for EMI calculation (Compound Interest)
-def calculate_emi(loan_amount, annual_interest_rate, tenure_months):
-    if annual_interest_rate == 0 or tenure_months == 0:
-        return Decimal('0.00') # Or handle as error/special case
-
-    # Convert annual interest rate to monthly decimal rate
-    monthly_interest_rate = annual_interest_rate / 12 / 100
-
-    if monthly_interest_rate == 0: # For 0% interest
-        emi = loan_amount / tenure_months
-    else:
-        # Formula for EMI: P * R * (1 + R)^N / ((1 + R)^N - 1)
-        # Where P = Principal, R = Monthly Interest Rate, N = Tenure in Months
-        numerator = loan_amount * monthly_interest_rate * (1 + monthly_interest_rate)**tenure_months
-        denominator = ((1 + monthly_interest_rate)**tenure_months - 1)
-        if denominator == 0: # Should not happen with positive interest rates and tenure
-            return Decimal('0.00')
-        emi = numerator / denominator
-
-    return Decimal(emi).quantize(Decimal('0.01')) # Round to 2 decimal places
-
 class RegisterView(APIView):
     permission_classes = [AllowAny] # Allow anyone to register
 
@@ -59,171 +38,120 @@ class LoginView(APIView):
 
         user = authenticate(username=username, password=password)
         if user:
-            token, created = Token.objects.get_or_create(user=user)
-            return Response({'customer_id': user.customer.customer_id, 'token': token.key}, status=status.HTTP_200_OK)
+            # customer_id rides along as a claim (copied into every access token derived from this refresh token),
+            # so authenticated views can check ownership without loading the User or Customer
+            refresh = RefreshToken.for_user(user)
+            refresh['customer_id'] = user.customer.customer_id
+            return Response({
+                'customer_id': user.customer.customer_id,
+                'token': str(refresh.access_token),
+                'refresh': str(refresh)
+            }, status=status.HTTP_200_OK)
         return Response({'message': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
 class CheckEligibilityView(APIView):
     permission_classes = [IsAuthenticated] # Requires authentication
 
     def post(self, request):
-        serializer = LoanApplicationSerializer(data=request.data)
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        application, errors = parse_loan_application(request.data)
+        if errors is not None:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
 
-        customer_id = serializer.validated_data['customer_id']
-        loan_amount = serializer.validated_data['loan_amount']
-        tenure = serializer.validated_data['tenure']
-        interest_rate = serializer.validated_data['interest_rate']
+        customer_id = application.customer_id
+        loan_amount = application.loan_amount
+        tenure = application.tenure
+        interest_rate = application.interest_rate
+
+        # Ensure authenticated user matches the requested customer_id (claim in the JWT)
+        if request.auth.get('customer_id') != customer_id:
+            return Response({'message': 'Unauthorized access to customer data'}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            customer = Customer.objects.get(customer_id=customer_id)
+            customer = Customer.objects.only(
+                'customer_id', 'monthly_salary', 'approved_limit', 'current_debt', 'credit_score_pct'
+            ).get(pk=customer_id)
         except Customer.DoesNotExist:
             return Response({'message': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Ensure authenticated user matches the requested customer_id
-        if request.user.customer != customer:
-            return Response({'message': 'Unauthorized access to customer data'}, status=status.HTTP_403_FORBIDDEN)
-
         # --- Business Logic for Eligibility ---
+        decision = eligibility.evaluate_loan(customer, loan_amount, tenure, interest_rate, date.today())
 
-        # 1. Check sum of all current EMIs of existing active loans > 50% of monthly salary
-        # "Active" loans: approved loans whose end_date is in the future or today
-        active_loans = customer.loan_set.filter(loan_approved=True, end_date__gte=date.today())
-        total_current_emis = active_loans.aggregate(Sum('monthly_installment'))['monthly_installment__sum'] or Decimal('0.00')
-
-        proposed_emi = calculate_emi(loan_amount, interest_rate, tenure)
-
-        if (total_current_emis + proposed_emi) > (customer.monthly_salary * Decimal('0.5')):
-            return Response({
-                "customer_id": customer.customer_id,
-                "loan_approved": False,
-                "approved_limit": customer.approved_limit,
-                "interest_rate": interest_rate, # Original requested rate
-                "monthly_installment": proposed_emi,
-                "tenure": tenure,
-                "message": "Loan rejected: Total EMIs (including proposed) exceed 50% of monthly salary"
-            }, status=status.HTTP_200_OK)
-
-        # 2. Past loan repayment history (EMIs paid on time rate)
-        past_loans_count = customer.loan_set.count()
-        final_interest_rate = interest_rate # Start with requested rate
-
-        if past_loans_count > 0:
-            # Sum of EMIs paid on time vs. total expected EMIs across all past loans
-            total_emis_paid_on_time = customer.loan_set.aggregate(Sum('emis_paid_on_time'))['emis_paid_on_time__sum'] or 0
-            total_tenure_sum = customer.loan_set.aggregate(Sum('tenure'))['tenure__sum'] or 1 # Avoid division by zero
-
-            # Simple "credit score" based on EMIs paid on time ratio
-            credit_score_percentage = (total_emis_paid_on_time / total_tenure_sum) * 100
-
-            if credit_score_percentage > 85: # Excellent repayment
-                final_interest_rate = interest_rate # Keep requested rate
-            elif 85 >= credit_score_percentage > 60: # Good repayment
-                final_interest_rate = max(interest_rate, Decimal('12.00')) # At least 12%
-            elif 60 >= credit_score_percentage > 40: # Moderate repayment
-                final_interest_rate = max(interest_rate, Decimal('16.00')) # At least 16%
-            else: # Poor repayment history
-                return Response({
-                    "customer_id": customer.customer_id,
-                    "loan_approved": False,
-                    "approved_limit": customer.approved_limit,
-                    "interest_rate": interest_rate,
-                    "monthly_installment": proposed_emi,
-                    "tenure": tenure,
-                    "message": "Loan rejected: Poor past loan repayment history (less than 40% EMIs on time)"
-                }, status=status.HTTP_200_OK)
-        else:
-            # New customer with no past loans, consider it good for interest rate
-            # The assignment doesn't specify a special rate for new customers, so use requested.
-            # If you want to enforce a minimum for new customers, e.g., 10%, add:
-            # final_interest_rate = max(interest_rate, Decimal('10.00'))
-            pass
-
-
-        # 3. Check if current_debt + requested loan_amount > approved_limit
-        # customer.current_debt should reflect the total outstanding principal from active loans.
-        # Assuming current_debt is updated correctly by the system.
-        if (customer.current_debt + loan_amount) > customer.approved_limit:
-            return Response({
-                "customer_id": customer.customer_id,
-                "loan_approved": False,
-                "approved_limit": customer.approved_limit,
-                "interest_rate": interest_rate,
-                "monthly_installment": proposed_emi,
-                "tenure": tenure,
-                "message": "Loan rejected: Proposed loan amount plus current debt exceeds approved limit"
-            }, status=status.HTTP_200_OK)
-
-        # All checks passed, loan is eligible
-        final_monthly_installment = calculate_emi(loan_amount, final_interest_rate, tenure)
-
-        return Response({
+        response_data = {
             "customer_id": customer.customer_id,
-            "loan_approved": True,
+            "loan_approved": decision.approved,
             "approved_limit": customer.approved_limit,
-            "interest_rate": final_interest_rate,
-            "monthly_installment": final_monthly_installment,
-            "tenure": tenure,
-            "message": "Loan is eligible for approval"
-        }, status=status.HTTP_200_OK)
+            "interest_rate": decision.final_rate, # Original requested rate when rejected
+            "monthly_installment": decision.emi,
+            "tenure": decision.tenure,
+            "message": decision.message
+        }
+        if decision.approved:
+            # Lets /create_loan reuse this decision for the same application instead of recomputing it
+            response_data["eligibility_token"] = eligibility.issue_token(
+                customer, loan_amount, tenure, interest_rate, decision
+            )
+        return Response(response_data, status=status.HTTP_200_OK)
 
 class CreateLoanView(APIView):
     permission_classes = [IsAuthenticated] # Requires authentication
 
     def post(self, request):
-        serializer = LoanApplicationSerializer(data=request.data)
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        application, errors = parse_loan_application(request.data)
+        if errors is not None:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
 
-        customer_id = serializer.validated_data['customer_id']
-        loan_amount = serializer.validated_data['loan_amount']
-        tenure = serializer.validated_data['tenure']
-        interest_rate = serializer.validated_data['interest_rate']
+        customer_id = application.customer_id
+        loan_amount = application.loan_amount
+        tenure = application.tenure
+        interest_rate = application.interest_rate
 
-        try:
-            customer = Customer.objects.get(customer_id=customer_id)
-        except Customer.DoesNotExist:
-            return Response({'message': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        # Ensure authenticated user matches the requested customer_id
-        if request.user.customer != customer:
+        # Ensure authenticated user matches the requested customer_id (claim in the JWT)
+        if request.auth.get('customer_id') != customer_id:
             return Response({'message': 'Unauthorized access'}, status=status.HTTP_403_FORBIDDEN)
 
-        # Re-run eligibility checks to determine final approval and terms
-        # This is critical to ensure consistency with eligibility check
-        approved, final_interest_rate, monthly_installment, final_tenure, message = self._run_eligibility_checks(
-            customer, loan_amount, tenure, interest_rate
-        )
-
-        if not approved:
-            return Response({
-                'loan_id': None,
-                'customer_id': customer_id,
-                'loan_approved': False,
-                'message': message,
-                'monthly_installment': None # No installment if not approved
-            }, status=status.HTTP_200_OK) # Return 200 OK with approval status false
-
+        today = date.today()
         with transaction.atomic():
+            # Lock the customer row so concurrent applications are decided and booked one at a time;
+            # otherwise two requests could both pass the debt check against the same current_debt
+            try:
+                customer = Customer.objects.select_for_update().only(
+                    'customer_id', 'monthly_salary', 'current_debt', 'approved_limit', 'credit_score_pct'
+                ).get(pk=customer_id)
+            except Customer.DoesNotExist:
+                return Response({'message': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
+
+            # Reuse a fresh /check_eligibility decision for this exact application when the client sends one,
+            # otherwise run the eligibility checks to determine final approval and terms
+            decision = eligibility.redeem_token(
+                application.eligibility_token, customer, loan_amount, tenure, interest_rate
+            ) or eligibility.evaluate_loan(customer, loan_amount, tenure, interest_rate, today)
+
+            if not decision.approved:
+                return Response({
+                    'loan_id': None,
+                    'customer_id': customer_id,
+                    'loan_approved': False,
+                    'message': decision.message,
+                    'monthly_installment': None # No installment if not approved
+                }, status=status.HTTP_200_OK) # Return 200 OK with approval status false
+
             # Create the new loan record
             new_loan = Loan.objects.create(
                 customer=customer,
                 loan_amount=loan_amount,
-                tenure=final_tenure,
-                interest_rate=final_interest_rate,
-                monthly_installment=monthly_installment,
+                tenure=decision.tenure,
+                interest_rate=decision.final_rate,
+                monthly_installment=decision.emi,
                 emis_paid_on_time=0, # New loan starts with 0 EMIs paid
-                date_of_approval=date.today(),
-                end_date=date.today() + timedelta(days=30 * final_tenure), # Approximate end date
+                date_of_approval=today,
+                end_date=today + timedelta(days=30 * decision.tenure), # Approximate end date
                 loan_approved=True,
                 message="Loan approved and created"
             )
 
             # Update customer's current_debt
-            # This should add the principal of the new loan to current_debt
-            customer.current_debt += loan_amount
-            customer.save()
+            # This should add the principal of the new loan to current_debt, in SQL so no stale value is written back
+            Customer.objects.filter(pk=customer_id).update(current_debt=F('current_debt') + loan_amount)
 
         response_data = {
             "loan_id": new_loan.loan_id,
@@ -234,58 +162,24 @@ class CreateLoanView(APIView):
         }
         return Response(response_data, status=status.HTTP_201_CREATED)
 
-    def _run_eligibility_checks(self, customer, loan_amount, tenure, interest_rate):
-        # This internal method encapsulates the eligibility logic for re-use
-        # It's a simplified copy from CheckEligibilityView for direct use here.
-
-        # 1. Check sum of all current EMIs of existing active loans > 50% of monthly salary
-        active_loans = customer.loan_set.filter(loan_approved=True, end_date__gte=date.today())
-        total_current_emis = active_loans.aggregate(Sum('monthly_installment'))['monthly_installment__sum'] or Decimal('0.00')
-        proposed_emi = calculate_emi(loan_amount, interest_rate, tenure)
-
-        if (total_current_emis + proposed_emi) > (customer.monthly_salary * Decimal('0.5')):
-            return False, None, None, None, "Loan rejected: Total EMIs (including proposed) exceed 50% of monthly salary"
-
-        # 2. Past loan repayment history (EMIs paid on time rate)
-        past_loans_count = customer.loan_set.count()
-        final_interest_rate = interest_rate
-
-        if past_loans_count > 0:
-            total_emis_paid_on_time = customer.loan_set.aggregate(Sum('emis_paid_on_time'))['emis_paid_on_time__sum'] or 0
-            total_tenure_sum = customer.loan_set.aggregate(Sum('tenure'))['tenure__sum'] or 1
-            credit_score_percentage = (total_emis_paid_on_time / total_tenure_sum) * 100
-
-            if credit_score_percentage > 85:
-                final_interest_rate = interest_rate
-            elif 85 >= credit_score_percentage > 60:
-                final_interest_rate = max(interest_rate, Decimal('12.00'))
-            elif 60 >= credit_score_percentage > 40:
-                final_interest_rate = max(interest_rate, Decimal('16.00'))
-            else:
-                return False, None, None, None, "Loan rejected: Poor past loan repayment history (less than 40% EMIs on time)"
-        else:
-            pass # New customer, no special rate adjustment based on history
-
-        # 3. Check if current_debt + requested loan_amount > approved_limit
-        if (customer.current_debt + loan_amount) > customer.approved_limit:
-            return False, None, None, None, "Loan rejected: Proposed loan amount plus current debt exceeds approved limit"
-
-        # All checks passed
-        final_monthly_installment = calculate_emi(loan_amount, final_interest_rate, tenure)
-        return True, final_interest_rate, final_monthly_installment, tenure, "Loan approved"
-
 
 class ViewLoanDetailsView(APIView):
     permission_classes = [IsAuthenticated] # Requires authentication
 
     def get(self, request, loan_id):
         try:
-            loan = Loan.objects.get(loan_id=loan_id)
+            # One JOINed query for the loan and the nested customer fields LoanDetailSerializer renders
+            loan = Loan.objects.select_related('customer').only(
+                'loan_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_installment',
+                'emis_paid_on_time', 'date_of_approval', 'end_date', 'loan_approved', 'message',
+                'customer__customer_id', 'customer__first_name', 'customer__last_name',
+                'customer__phone_number', 'customer__age'
+            ).get(loan_id=loan_id)
         except Loan.DoesNotExist:
             return Response({'message': 'Loan not found'}, status=status.HTTP_404_NOT_FOUND)
 
         # Ensure authenticated user owns this loan's customer
-        if request.user.customer != loan.customer:
+        if request.auth.get('customer_id') != loan.customer_id:
             return Response({'message': 'Unauthorized access to loan details'}, status=status.HTTP_403_FORBIDDEN)
 
         serializer = LoanDetailSerializer(loan)
@@ -296,23 +190,25 @@ class ViewCustomerLoansView(APIView):
     permission_classes = [IsAuthenticated] # Requires authentication
 
     def get(self, request, customer_id):
-        try:
-            customer = Customer.objects.get(customer_id=customer_id)
-        except Customer.DoesNotExist:
-            return Response({'message': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        # Ensure authenticated user matches the requested customer_id
-        if request.user.customer != customer:
+        # Ensure authenticated user matches the requested customer_id (claim in the JWT); no Customer fetch is needed
+        if request.auth.get('customer_id') != customer_id:
             return Response({'message': 'Unauthorized access to customer loans'}, status=status.HTTP_403_FORBIDDEN)
 
         # Filter for current/active loans: approved loans where repayments_left > 0
         # or end_date is in the future/today.
         # The assignment asks for "all current loan details".
         # Let's interpret "current" as approved loans that are not yet fully paid.
-        current_loans = customer.loan_set.filter(
+        # repayments_left is a Python property, so the same difference is computed in SQL to filter on
+        current_loans = Loan.objects.annotate(
+            emis_left=F('tenure') - F('emis_paid_on_time')
+        ).filter(
+            customer_id=customer_id,
             loan_approved=True,
-            repayments_left__gt=0 # Using the property from the model
-        ).order_by('-date_of_approval') # Order by most recent first
+            emis_left__gt=0
+        ).order_by('-date_of_approval').only( # Order by most recent first
+            # Only the columns the list serializer reads; tenure and emis_paid_on_time feed repayments_left
+            'loan_id', 'loan_amount', 'interest_rate', 'monthly_installment', 'tenure', 'emis_paid_on_time'
+        )
 
         serializer = CustomerLoansListSerializer(current_loans, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
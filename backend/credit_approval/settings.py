@@ -10,8 +10,20 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+from datetime import timedelta
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
+
+def required_env(name):
+    # Secrets and signing keys have no default in the repo: startup fails until they are provided
+    value = os.environ.get(name)
+    if not value:
+        raise ImproperlyConfigured(f'The {name} environment variable must be set.')
+    return value
+
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -20,7 +32,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-n$+5cpy-1nf9f4as^)1w=85(1o%xem%o_t*^_7rh7dy$3e3bus'
+SECRET_KEY = required_env('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -38,6 +50,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework', # Add this line
+    'rest_framework_simplejwt', # Signed access tokens issued by LoginView
     'core',
 ]
 
@@ -82,10 +95,43 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', 'password'),
         'HOST': os.environ.get('DB_HOST', 'db'), # 'db' is the service name in docker-compose
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # Keep connections open across requests instead of reconnecting per request; 0 restores that.
+        # Health checks drop a connection the server has closed before it is reused.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
 
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        # Verifies the JWT signature only; no User/Customer query per request.
+        # The views read the customer_id claim from request.auth for ownership checks.
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
+    ],
+    # orjson-backed JSON in both directions; the browsable API is kept for development
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    # Its own key rather than the SECRET_KEY default, so the two can be rotated separately
+    'SIGNING_KEY': required_env('JWT_SIGNING_KEY'),
+}
+
+# Signs the short-lived /check_eligibility tokens redeemed by /create_loan (see core.eligibility)
+ELIGIBILITY_TOKEN_KEY = required_env('ELIGIBILITY_TOKEN_KEY')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 